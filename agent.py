@@ -7,17 +7,28 @@ Uses Claude to understand queries, write code, and execute against SQLite.
 
 from __future__ import annotations
 
+import builtins
+import ctypes
+import functools
+import io
 import json
 import os
 import sqlite3
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 import traceback
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import anthropic
+import httpx
+import orjson
+
+from modules import get_registry, update_registry
 
 # Paths
 BASE_DIR = Path(__file__).parent
@@ -27,20 +38,127 @@ REGISTRY_PATH = BASE_DIR / "modules" / "registry.json"
 MODULES_DIR = BASE_DIR / "modules"
 CONFIG_PATH = BASE_DIR / "config.json"
 
+# execute_python snippets import saved modules from the repo root
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+PYTHON_TIMEOUT = 30  # seconds
+PYTHON_TIMEOUT_REPEAT = 1.0  # seconds between re-raises if a snippet swallows the timeout
+PYTHON_TIMEOUT_GRACE = 5  # further seconds to wait before abandoning a snippet
+MAX_SQL_ROWS = 100  # rows returned to Claude per execute_sql call
+SQL_CACHE_SIZE = 256  # cached execute_sql results per thread
+STREAM_UPDATE_INTERVAL = 0.5  # seconds between streamed progress updates
 
+
+@functools.lru_cache(maxsize=1)
 def load_config():
-    """Load configuration."""
-    with open(CONFIG_PATH, "r") as f:
-        return json.load(f)
+    """Load configuration, read from disk once per process."""
+    return orjson.loads(CONFIG_PATH.read_bytes())
+
+
+# Anthropic client shared by every StravaAgent, created on first use
+_anthropic_client = None
+_anthropic_lock = threading.Lock()
+
+
+def get_anthropic_client() -> anthropic.Anthropic:
+    """Get the process-wide Anthropic client.
+
+    All agents share one HTTP/2 connection pool, so TLS sessions stay warm
+    across channels and tool-loop requests.
+    """
+    global _anthropic_client
+    if _anthropic_client is None:
+        with _anthropic_lock:
+            if _anthropic_client is None:
+                http_client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                    timeout=60.0,
+                )
+                _anthropic_client = anthropic.Anthropic(
+                    api_key=load_config()["anthropic"]["api_key"],
+                    http_client=http_client,
+                )
+    return _anthropic_client
+
+
+# One long-lived read-only connection per thread
+_conn_local = threading.local()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Get this thread's database connection, opening it on first use."""
+    conn = getattr(_conn_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA temp_store=memory")
+        conn.execute("PRAGMA synchronous=normal")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA query_only=1")
+        _conn_local.conn = conn
+        # data_version is only comparable on the same connection, so the cache starts fresh
+        _conn_local.sql_cache = OrderedDict()
+        _conn_local.data_version = None
+        _conn_local.db_stats = None
+    return conn
+
+
+def _get_db_stats() -> tuple[int, str | None, str | None]:
+    """Get (count, first date, last date) of activities, cached until the database changes."""
+    conn = _get_conn()
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if _conn_local.db_stats and _conn_local.db_stats[0] == data_version:
+        return _conn_local.db_stats[1]
+
+    # Separate queries so MIN/MAX are single idx_start_date_local lookups, not a table scan
+    count = conn.execute("SELECT COUNT(*) FROM activities").fetchone()[0]
+    min_date = conn.execute("SELECT MIN(start_date_local) FROM activities").fetchone()[0]
+    max_date = conn.execute("SELECT MAX(start_date_local) FROM activities").fetchone()[0]
+
+    stats = (count, min_date, max_date)
+    _conn_local.db_stats = (data_version, stats)
+    return stats
+
+
+def _sql_cache_stats() -> tuple[int, int]:
+    """Get this thread's execute_sql cache (hits, misses) so far."""
+    return getattr(_conn_local, "sql_cache_hits", 0), getattr(_conn_local, "sql_cache_misses", 0)
+
+
+# Last assembled system prompt and the file state it was built from
+_PROMPT_CACHE = {"key": None, "value": None}
+
+
+def _mtime_ns(path) -> int | None:
+    """Return a file's mtime in nanoseconds, or None if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
 
 def get_system_prompt():
-    """Build the full system prompt with context."""
+    """Build the full system prompt with context.
+
+    The result is cached until the prompt, registry, or database files change.
+    """
+    # The WAL file is included because writes in WAL mode don't touch the main db file
+    key = (
+        _mtime_ns(CONTEXT_PATH),
+        _mtime_ns(REGISTRY_PATH),
+        _mtime_ns(DB_PATH),
+        _mtime_ns(f"{DB_PATH}-wal"),
+    )
+    if key == _PROMPT_CACHE["key"]:
+        return _PROMPT_CACHE["value"]
+
     with open(CONTEXT_PATH, "r") as f:
         base_prompt = f.read()
 
-    with open(REGISTRY_PATH, "r") as f:
-        registry = json.load(f)
+    registry = get_registry()
 
     # Add module information
     if registry["modules"]:
@@ -56,10 +174,7 @@ def get_system_prompt():
 
     # Add database stats
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.execute("SELECT COUNT(*), MIN(start_date_local), MAX(start_date_local) FROM activities")
-        count, min_date, max_date = cursor.fetchone()
-        conn.close()
+        count, min_date, max_date = _get_db_stats()
 
         if count:
             base_prompt += f"\n\n## Database Status\n\n"
@@ -68,6 +183,8 @@ def get_system_prompt():
     except Exception:
         pass
 
+    _PROMPT_CACHE["key"] = key
+    _PROMPT_CACHE["value"] = base_prompt
     return base_prompt
 
 
@@ -75,7 +192,7 @@ def get_system_prompt():
 TOOLS = [
     {
         "name": "execute_sql",
-        "description": "Execute a SQL query against the Strava activities database. Use this for simple queries. Returns results as a list of dictionaries.",
+        "description": "Execute a SQL query against the Strava activities database. Use this for simple queries. Returns results in columnar form: {\"columns\": [...], \"rows\": [[...], ...], \"total_count\": n}, with at most 100 rows.",
         "input_schema": {
             "type": "object",
             "properties": {
@@ -89,7 +206,7 @@ TOOLS = [
     },
     {
         "name": "execute_python",
-        "description": "Execute a Python script for complex analysis. The script has access to sqlite3, json, datetime, and the database at 'db/activities.db'. Print your results - the output will be captured and returned.",
+        "description": "Execute a Python script for complex analysis. The script has access to sqlite3, json, datetime, timedelta, Path, the database path as DB_PATH, and get_db() which returns a read-only connection: writes of any kind fail with \"attempt to write a readonly database\", including CREATE TEMP TABLE, so use CTEs or Python data structures for intermediate results. Print your results - the output will be captured and returned.",
         "input_schema": {
             "type": "object",
             "properties": {
@@ -162,32 +279,226 @@ def execute_sql(query: str) -> dict:
         return {"error": "Only SELECT queries are allowed"}
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = _get_conn()
+        cache = _conn_local.sql_cache
+
+        # data_version changes whenever another connection commits
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != _conn_local.data_version:
+            cache.clear()
+            _conn_local.data_version = data_version
+
+        hits, misses = _sql_cache_stats()
+        if query in cache:
+            cache.move_to_end(query)
+            _conn_local.sql_cache_hits = hits + 1
+            return cache[query]
+        _conn_local.sql_cache_misses = misses + 1
+
         cursor = conn.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
+        cursor.row_factory = None
+
+        # Columnar form: column names once instead of repeated in every row
+        columns = [description[0] for description in cursor.description]
+        rows = [list(row) for row in cursor.fetchmany(MAX_SQL_ROWS)]
+        # Count the rest without materializing it
+        total_count = len(rows) + sum(1 for _ in cursor)
 
-        # Convert to list of dicts
-        results = [dict(row) for row in rows]
+        result = {"columns": columns, "rows": rows, "total_count": total_count}
 
         # Limit results for display
-        if len(results) > 100:
-            return {
-                "results": results[:100],
-                "total_count": len(results),
-                "truncated": True,
-                "message": f"Showing first 100 of {len(results)} results",
-            }
+        if total_count > len(rows):
+            result["truncated"] = True
+            result["message"] = f"Showing first {len(rows)} of {total_count} results"
+
+        # Results depending on the clock or randomness can't be reused
+        lowered = query.lower()
+        if not any(word in lowered for word in ("now", "random", "current_")):
+            cache[query] = result
+            if len(cache) > SQL_CACHE_SIZE:
+                cache.popitem(last=False)
 
-        return {"results": results, "total_count": len(results)}
+        return result
 
     except Exception as e:
         return {"error": str(e)}
 
 
+class _ThreadLocalStream:
+    """Stand-in for sys.stdout/sys.stderr that routes writes per thread.
+
+    A thread running an execute_python snippet registers its own buffer, so
+    everything the snippet prints (print, pprint, sys.stdout.write, saved
+    modules it imports) is captured, while other threads keep writing to the
+    real stream. Threads the snippet starts itself are not captured.
+    """
+
+    def __init__(self, name: str, real):
+        self._name = name
+        self._real = real
+
+    def _target(self):
+        return getattr(_capture_local, self._name, None) or self._real
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+
+# Per-thread capture buffers, set only while that thread runs a snippet
+_capture_local = threading.local()
+
+if not isinstance(sys.stdout, _ThreadLocalStream):
+    sys.stdout = _ThreadLocalStream("stdout", sys.stdout)
+if not isinstance(sys.stderr, _ThreadLocalStream):
+    sys.stderr = _ThreadLocalStream("stderr", sys.stderr)
+
+# Globals each in-process execute_python snippet starts from
+_SANDBOX_GLOBALS = {
+    "__builtins__": builtins,
+    "__name__": "__main__",
+    "sqlite3": sqlite3,
+    "json": json,
+    "datetime": datetime,
+    "timedelta": timedelta,
+    "Path": Path,
+    "DB_PATH": str(DB_PATH),
+    "get_db": _get_conn,
+}
+
+
+class _ToolTimeout(BaseException):
+    """Raised inside a running snippet when it exceeds PYTHON_TIMEOUT.
+
+    A BaseException so a snippet's own ``except Exception`` can't swallow it.
+    """
+
+
+class _Watchdog:
+    """Interrupt a thread's running snippet once PYTHON_TIMEOUT has elapsed.
+
+    The timeout is re-raised every PYTHON_TIMEOUT_REPEAT seconds until the
+    thread exits or cancel() is called, since the snippet may catch it with a
+    bare ``except:``. It is only delivered between bytecodes, so a blocking C
+    call such as time.sleep() or a socket read runs to completion first. Long
+    SQLite queries are the exception, as they are stopped with conn.interrupt().
+    """
+
+    def __init__(self, thread_id: int, conn: sqlite3.Connection):
+        self.thread_id = thread_id
+        self.conn = conn
+        self.fired = False
+        self._active = True
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(PYTHON_TIMEOUT, self._fire)
+        self._timer.daemon = True
+
+    def start(self):
+        self._timer.start()
+
+    def cancel(self):
+        with self._lock:
+            self._active = False
+            self._timer.cancel()
+
+    def _fire(self):
+        with self._lock:
+            if not self._active:
+                return
+            self.fired = True
+            # Raised at the snippet's next bytecode; interrupt() covers a long-running query
+            delivered = ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(self.thread_id), ctypes.py_object(_ToolTimeout)
+            )
+            self.conn.interrupt()
+
+            # Keep raising in case the snippet caught it, until its thread is gone
+            if delivered:
+                self._timer = threading.Timer(PYTHON_TIMEOUT_REPEAT, self._fire)
+                self._timer.daemon = True
+                self._timer.start()
+
+
 def execute_python(code: str, explanation: str) -> dict:
-    """Execute Python code and capture output."""
+    """Execute Python code and capture output.
+
+    Runs in-process on the pooled connection, in a thread of its own. If the
+    snippet outlives PYTHON_TIMEOUT + PYTHON_TIMEOUT_GRACE (it swallows every
+    timeout, or is stuck in a blocking call) it is abandoned so the caller
+    isn't held; the watchdog keeps trying to stop it in the background. Set
+    "unsafe_subprocess_fallback" in config.json to run each snippet in a fresh
+    interpreter instead.
+    """
+    if load_config().get("unsafe_subprocess_fallback"):
+        return _execute_python_subprocess(code)
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    result = {"return_code": 0}
+
+    try:
+        conn = _get_conn()
+    except Exception as e:
+        return {"error": str(e)}
+
+    sandbox = dict(_SANDBOX_GLOBALS)
+    sandbox["get_db"] = lambda: conn
+
+    def run():
+        # Only this thread's writes to sys.stdout/sys.stderr land in the buffers
+        _capture_local.stdout = stdout
+        _capture_local.stderr = stderr
+        try:
+            exec(compile(code, "<tool>", "exec"), sandbox)
+        except SystemExit as e:
+            result["return_code"] = e.code if isinstance(e.code, int) else 1
+        except _ToolTimeout:
+            pass
+        except Exception:
+            traceback.print_exc()
+            result["return_code"] = 1
+        finally:
+            _capture_local.stdout = None
+            _capture_local.stderr = None
+
+    thread = threading.Thread(target=run, name="execute_python", daemon=True)
+    thread.start()
+    watchdog = _Watchdog(thread.ident, conn)
+    watchdog.start()
+    thread.join(PYTHON_TIMEOUT + PYTHON_TIMEOUT_GRACE)
+
+    if thread.is_alive():
+        # Leave the runaway snippet the connection; this thread opens a new one
+        _conn_local.conn = None
+        return {"error": f"Script timed out after {PYTHON_TIMEOUT} seconds"}
+    watchdog.cancel()
+
+    # Drop the pooled connection if the snippet closed it
+    try:
+        conn.total_changes
+    except sqlite3.ProgrammingError:
+        _conn_local.conn = None
+
+    if watchdog.fired:
+        return {"error": f"Script timed out after {PYTHON_TIMEOUT} seconds"}
+
+    output = stdout.getvalue()
+    if stderr.getvalue():
+        output += f"\n[stderr]: {stderr.getvalue()}"
+
+    return {
+        "output": output.strip() if output.strip() else "(no output)",
+        "return_code": result["return_code"],
+    }
+
+
+def _execute_python_subprocess(code: str) -> dict:
+    """Execute Python code in a separate interpreter and capture output."""
     # Create a temp file with the code
     with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
         # Add imports and db path
@@ -220,7 +531,7 @@ def get_db():
             [sys.executable, temp_path],
             capture_output=True,
             text=True,
-            timeout=30,
+            timeout=PYTHON_TIMEOUT,
             cwd=str(BASE_DIR),
         )
 
@@ -234,13 +545,27 @@ def get_db():
         }
 
     except subprocess.TimeoutExpired:
-        return {"error": "Script timed out after 30 seconds"}
+        return {"error": f"Script timed out after {PYTHON_TIMEOUT} seconds"}
     except Exception as e:
         return {"error": str(e)}
     finally:
         os.unlink(temp_path)
 
 
+# Repository handle reused across create_module calls
+_git_repo = None
+
+
+def _get_repo():
+    """Get the pygit2 repository for BASE_DIR, opening it on first use."""
+    global _git_repo
+    if _git_repo is None:
+        import pygit2
+
+        _git_repo = pygit2.Repository(str(BASE_DIR))
+    return _git_repo
+
+
 def create_module(name: str, description: str, code: str, functions: list[str]) -> dict:
     """Create a new reusable module and prepare it for commit."""
     filename = f"{name}.py"
@@ -257,30 +582,26 @@ def create_module(name: str, description: str, code: str, functions: list[str])
             f.write(code)
 
         # Update registry
-        with open(REGISTRY_PATH, "r") as f:
-            registry = json.load(f)
-
-        registry["modules"].append({
-            "name": name,
-            "file": filename,
-            "description": description,
-            "functions": functions,
-        })
-
-        with open(REGISTRY_PATH, "w") as f:
-            json.dump(registry, f, indent=2)
+        update_registry(name, filename, description, functions)
 
         # Create a branch and commit
         branch_name = f"module/{name}"
         commit_msg = f"Add {name} module: {description}"
 
         try:
+            repo = _get_repo()
             # Create branch
-            subprocess.run(["git", "checkout", "-b", branch_name], cwd=BASE_DIR, capture_output=True)
+            repo.branches.local.create(branch_name, repo[repo.head.target])
+            repo.checkout(f"refs/heads/{branch_name}")
             # Add files
-            subprocess.run(["git", "add", str(filepath), str(REGISTRY_PATH)], cwd=BASE_DIR, capture_output=True)
+            index = repo.index
+            index.read()
+            index.add(str(filepath.relative_to(BASE_DIR)))
+            index.add(str(REGISTRY_PATH.relative_to(BASE_DIR)))
+            index.write()
             # Commit
-            subprocess.run(["git", "commit", "-m", commit_msg], cwd=BASE_DIR, capture_output=True)
+            signature = repo.default_signature
+            repo.create_commit("HEAD", signature, signature, commit_msg, index.write_tree(), [repo.head.target])
             # Create PR
             pr_result = subprocess.run(
                 ["gh", "pr", "create", "--title", commit_msg, "--body", f"Auto-generated module.\n\n{description}\n\nFunctions: {', '.join(functions)}"],
@@ -292,7 +613,7 @@ def create_module(name: str, description: str, code: str, functions: list[str])
             if pr_result.returncode == 0:
                 subprocess.run(["gh", "pr", "merge", "--merge", "--delete-branch"], cwd=BASE_DIR, capture_output=True)
             # Return to main
-            subprocess.run(["git", "checkout", "main"], cwd=BASE_DIR, capture_output=True)
+            repo.checkout("refs/heads/main")
 
             return {
                 "success": True,
@@ -315,10 +636,7 @@ def create_module(name: str, description: str, code: str, functions: list[str])
 
 def list_available_modules() -> dict:
     """List all available modules."""
-    with open(REGISTRY_PATH, "r") as f:
-        registry = json.load(f)
-
-    return {"modules": registry["modules"]}
+    return {"modules": get_registry()["modules"]}
 
 
 def sync_activities(force: bool = False) -> dict:
@@ -350,6 +668,11 @@ def sync_activities(force: bool = False) -> dict:
         }
 
 
+def _dumps(obj) -> str:
+    """Serialize a tool result as indented JSON."""
+    return orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+
 def handle_tool_call(tool_name: str, tool_input: dict) -> str:
     """Execute a tool and return the result as a string."""
     if tool_name == "execute_sql":
@@ -370,25 +693,37 @@ def handle_tool_call(tool_name: str, tool_input: dict) -> str:
     else:
         result = {"error": f"Unknown tool: {tool_name}"}
 
-    return json.dumps(result, indent=2, default=str)
+    return _dumps(result)
 
 
-# Pricing per million tokens (as of 2025)
+# Pricing per million tokens (as of 2025); cache reads/writes are prompt-cache tokens
 PRICING = {
-    "claude-sonnet-4-20250514": {"input": 3.00, "output": 15.00},
+    "claude-sonnet-4-20250514": {"input": 3.00, "output": 15.00, "cache_read": 0.30, "cache_write": 3.75},
 }
+DEFAULT_PRICING = {"input": 3.00, "output": 15.00, "cache_read": 0.30, "cache_write": 3.75}
 
 
 class StravaAgent:
     """Agent that answers questions about Strava activities."""
 
-    def __init__(self):
-        config = load_config()
-        self.client = anthropic.Anthropic(api_key=config["anthropic"]["api_key"])
+    def __init__(self, client: anthropic.Anthropic | None = None, history: list | None = None):
+        """
+        Args:
+            client: Optional Anthropic client; defaults to the shared one
+            history: Optional externally-owned conversation history list
+        """
+        self.client = client if client is not None else get_anthropic_client()
         self.model = "claude-sonnet-4-20250514"
-        self.conversation_history = []
+        self.conversation_history = history if history is not None else []
         self.last_usage = None  # Store usage from last ask()
 
+        # Per-token rates for the model, resolved once
+        pricing = PRICING.get(self.model, DEFAULT_PRICING)
+        self._input_rate = pricing["input"] / 1_000_000
+        self._output_rate = pricing["output"] / 1_000_000
+        self._cache_read_rate = pricing["cache_read"] / 1_000_000
+        self._cache_write_rate = pricing["cache_write"] / 1_000_000
+
     def ask(self, question: str, on_update=None) -> str:
         """
         Ask a question about Strava activities.
@@ -403,26 +738,45 @@ class StravaAgent:
         # Add user message to history
         self.conversation_history.append({"role": "user", "content": question})
 
-        system_prompt = get_system_prompt()
-        messages = self.conversation_history.copy()
+        # Request fields that stay fixed across the tool-use loop, built once.
+        # Cache breakpoint on the system prompt (tools are part of the same cached prefix)
+        request = {
+            "model": self.model,
+            "max_tokens": 4096,
+            "system": [{"type": "text", "text": get_system_prompt(), "cache_control": {"type": "ephemeral"}}],
+            "tools": TOOLS,
+        }
+        start_hits, start_misses = _sql_cache_stats()
+        messages = list(self.conversation_history)
 
         # Track token usage across all API calls for this question
         total_input_tokens = 0
         total_output_tokens = 0
+        total_cache_read_tokens = 0
+        total_cache_write_tokens = 0
+
+        # Tool result carrying the moving cache breakpoint for the conversation prefix
+        cached_block = None
 
         while True:
-            # Call Claude
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                system=system_prompt,
-                tools=TOOLS,
-                messages=messages,
-            )
+            # Call Claude, streaming partial text to on_update as it arrives
+            with self.client.messages.stream(**request, messages=messages) as stream:
+                if on_update:
+                    partial_text = ""
+                    last_update = time.monotonic()
+                    for text in stream.text_stream:
+                        partial_text += text
+                        now = time.monotonic()
+                        if now - last_update >= STREAM_UPDATE_INTERVAL:
+                            on_update(partial_text[-200:])
+                            last_update = now
+                response = stream.get_final_message()
 
             # Accumulate token usage
             total_input_tokens += response.usage.input_tokens
             total_output_tokens += response.usage.output_tokens
+            total_cache_read_tokens += getattr(response.usage, "cache_read_input_tokens", None) or 0
+            total_cache_write_tokens += getattr(response.usage, "cache_creation_input_tokens", None) or 0
 
             # Check if we need to handle tool calls
             if response.stop_reason == "tool_use":
@@ -446,6 +800,13 @@ class StravaAgent:
                 messages.append({"role": "assistant", "content": assistant_content})
                 messages.append({"role": "user", "content": tool_results})
 
+                # Move the cache breakpoint to the newest tool result so the next
+                # iteration reuses everything before it (the API allows only 4)
+                if cached_block is not None:
+                    del cached_block["cache_control"]
+                cached_block = tool_results[-1]
+                cached_block["cache_control"] = {"type": "ephemeral"}
+
             else:
                 # Got final response
                 final_text = ""
@@ -454,10 +815,20 @@ class StravaAgent:
                         final_text += block.text
 
                 # Store usage info
+                hits, misses = _sql_cache_stats()
                 self.last_usage = {
                     "input_tokens": total_input_tokens,
                     "output_tokens": total_output_tokens,
-                    "cost": self._calculate_cost(total_input_tokens, total_output_tokens),
+                    "cache_read_tokens": total_cache_read_tokens,
+                    "cache_write_tokens": total_cache_write_tokens,
+                    "cost": self._calculate_cost(
+                        total_input_tokens,
+                        total_output_tokens,
+                        total_cache_read_tokens,
+                        total_cache_write_tokens,
+                    ),
+                    "sql_cache_hits": hits - start_hits,
+                    "sql_cache_misses": misses - start_misses,
                 }
 
                 # Update conversation history with final exchange
@@ -465,23 +836,34 @@ class StravaAgent:
 
                 return final_text
 
-    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def _calculate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
         """Calculate cost in USD based on token usage."""
-        pricing = PRICING.get(self.model, {"input": 3.00, "output": 15.00})
-        input_cost = (input_tokens / 1_000_000) * pricing["input"]
-        output_cost = (output_tokens / 1_000_000) * pricing["output"]
-        return input_cost + output_cost
+        return (
+            input_tokens * self._input_rate
+            + output_tokens * self._output_rate
+            + cache_read_tokens * self._cache_read_rate
+            + cache_write_tokens * self._cache_write_rate
+        )
 
     def get_cost_string(self) -> str | None:
         """Get a formatted cost string for the last query."""
         if not self.last_usage:
             return None
         u = self.last_usage
-        return f"${u['cost']:.4f} ({u['input_tokens']:,} in / {u['output_tokens']:,} out)"
+        cost_str = f"${u['cost']:.4f} ({u['input_tokens']:,} in / {u['output_tokens']:,} out"
+        if u["cache_read_tokens"]:
+            cost_str += f" / {u['cache_read_tokens']:,} cached"
+        return cost_str + ")"
 
     def clear_history(self):
         """Clear conversation history."""
-        self.conversation_history = []
+        self.conversation_history.clear()
 
 
 def main():
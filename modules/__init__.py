@@ -7,6 +7,7 @@ query patterns. Each module is registered in registry.json.
 
 from __future__ import annotations
 
+import copy
 import json
 import os
 from pathlib import Path
@@ -14,11 +15,22 @@ from pathlib import Path
 MODULES_DIR = Path(__file__).parent
 REGISTRY_PATH = MODULES_DIR / "registry.json"
 
+# Parsed registry and the file mtime it was read at
+_REG_CACHE = {"mtime_ns": None, "data": None}
+
 
 def get_registry():
-    """Load the module registry."""
-    with open(REGISTRY_PATH, "r") as f:
-        return json.load(f)
+    """Load the module registry.
+
+    The parsed file is cached until its mtime changes. Callers get their own
+    copy, so modifying it doesn't affect the cache.
+    """
+    mtime_ns = os.stat(REGISTRY_PATH).st_mtime_ns
+    if _REG_CACHE["data"] is None or _REG_CACHE["mtime_ns"] != mtime_ns:
+        with open(REGISTRY_PATH, "r") as f:
+            _REG_CACHE["data"] = json.load(f)
+        _REG_CACHE["mtime_ns"] = mtime_ns
+    return copy.deepcopy(_REG_CACHE["data"])
 
 
 def update_registry(name: str, file: str, description: str, functions: list[str]):
@@ -43,6 +55,10 @@ def update_registry(name: str, file: str, description: str, functions: list[str]
     with open(REGISTRY_PATH, "w") as f:
         json.dump(registry, f, indent=2)
 
+    # Cache what was just written so the next read doesn't re-parse it
+    _REG_CACHE["data"] = registry
+    _REG_CACHE["mtime_ns"] = os.stat(REGISTRY_PATH).st_mtime_ns
+
 
 def list_modules():
     """Get a formatted list of available modules."""
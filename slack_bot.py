@@ -7,67 +7,162 @@ Uses Socket Mode for local development (no public URL needed).
 
 from __future__ import annotations
 
-import json
+import functools
 import os
 import re
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import orjson
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
 from agent import StravaAgent
 
+# Markdown patterns, compiled once at import
+_RE_MARKUP_START = re.compile(r'[`*_\[#]')
+_RE_BOLD_STAR_END = re.compile(r'\*\*|\n|`')
+_RE_BOLD_UNDER_END = re.compile(r'__|\n|`')
+_RE_LINK_TEXT_END = re.compile(r'\]|`')
+_RE_LINK_URL_END = re.compile(r'\)|`')
+_RE_LINE_END = re.compile(r'\n|`')
+_RE_HEADER_PREFIX = re.compile(r'#{1,6}[ \t]+(?=\S)')
+_RE_CODE_SPLIT = re.compile(r'(```[\s\S]*?```)')
+_RE_MENTION = re.compile(r"<@[A-Z0-9]+>")
+
+
+def _code_span_end(text: str, i: int) -> int:
+    """Return the index just past the code block or inline code at text[i], or 0."""
+    if text.startswith("```", i):
+        close = text.find("```", i + 3)
+        if close != -1:
+            return close + 3
+    # Inline code needs at least one character between the backticks
+    if text[i + 1:i + 2] not in ("", "`"):
+        close = text.find("`", i + 1)
+        if close != -1:
+            return close + 1
+    return 0
+
+
+def _find_outside_code(text: str, pattern: re.Pattern, pos: int) -> int:
+    """Return the start of pattern's next match outside code spans, or -1.
+
+    Patterns include "`" so code spans are found and skipped over.
+    """
+    while True:
+        match = pattern.search(text, pos)
+        if match is None:
+            return -1
+        if match.group() != "`":
+            return match.start()
+        pos = _code_span_end(text, match.start()) or match.start() + 1
+
+
+def _emphasis_end(text: str, pattern: re.Pattern, start: int) -> int:
+    """Return the index of the delimiter closing emphasis whose content begins at start, or -1."""
+    close = _find_outside_code(text, pattern, start)
+    # Content must be non-empty, so "****" isn't bold
+    if close == start and text[close] != "\n":
+        close = _find_outside_code(text, pattern, start + 1)
+    # ...and on a single line
+    if close == -1 or text[close] == "\n":
+        return -1
+    return close
+
+
+def _convert(text: str, out: list, headers: bool = True):
+    """Append the Slack mrkdwn form of text to out in a single left-to-right pass."""
+    pos = 0
+    while True:
+        match = _RE_MARKUP_START.search(text, pos)
+        if match is None:
+            out.append(text[pos:])
+            return
+
+        i = match.start()
+        out.append(text[pos:i])
+        char = text[i]
+        end = 0
+
+        if char == "`":
+            # Code blocks and inline code are copied verbatim
+            end = _code_span_end(text, i)
+            if end:
+                out.append(text[i:end])
+
+        elif char in "*_":
+            # Bold: **text** or __text__ → *text*
+            if text.startswith(char, i + 1):
+                pattern = _RE_BOLD_STAR_END if char == "*" else _RE_BOLD_UNDER_END
+                close = _emphasis_end(text, pattern, i + 2)
+                if close != -1:
+                    out.append("*")
+                    _convert(text[i + 2:close], out, headers=False)
+                    out.append("*")
+                    end = close + 2
+
+        elif char == "[":
+            # Links: [text](url) → <url|text>
+            label_end = _find_outside_code(text, _RE_LINK_TEXT_END, i + 1)
+            if label_end > i + 1 and text.startswith("(", label_end + 1):
+                url_end = _find_outside_code(text, _RE_LINK_URL_END, label_end + 2)
+                if url_end > label_end + 2:
+                    out.append(f"<{text[label_end + 2:url_end]}|")
+                    _convert(text[i + 1:label_end], out, headers=False)
+                    out.append(">")
+                    end = url_end + 1
+
+        elif headers and (i == 0 or text[i - 1] == "\n"):
+            # Headers: # text → *text* (bold, since Slack has no headers)
+            prefix = _RE_HEADER_PREFIX.match(text, i)
+            if prefix:
+                line_end = _find_outside_code(text, _RE_LINE_END, prefix.end())
+                if line_end == -1:
+                    line_end = len(text)
+                out.append("*")
+                _convert(text[prefix.end():line_end], out, headers=False)
+                out.append("*")
+                end = line_end
+
+        if end:
+            pos = end
+        else:
+            out.append(char)
+            pos = i + 1
+
 
 def markdown_to_slack(text: str) -> str:
     """Convert standard markdown to Slack's mrkdwn format."""
-    # Handle code blocks first (preserve them)
-    # Use placeholders that won't be matched by markdown patterns
-    code_blocks = []
-    def save_code_block(match):
-        code_blocks.append(match.group(0))
-        return f"\x00CODE_BLOCK_{len(code_blocks) - 1}\x00"
-
-    text = re.sub(r'```[\s\S]*?```', save_code_block, text)
-
-    # Inline code (preserve)
-    inline_codes = []
-    def save_inline_code(match):
-        inline_codes.append(match.group(0))
-        return f"\x00INLINE_CODE_{len(inline_codes) - 1}\x00"
-
-    text = re.sub(r'`[^`]+`', save_inline_code, text)
-
-    # Bold: **text** or __text__ → *text*
-    text = re.sub(r'\*\*(.+?)\*\*', r'*\1*', text)
-    text = re.sub(r'__(.+?)__', r'*\1*', text)
-
-    # Links: [text](url) → <url|text>
-    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<\2|\1>', text)
-
-    # Headers: # text → *text* (bold, since Slack has no headers)
-    text = re.sub(r'^#{1,6}\s+(.+)$', r'*\1*', text, flags=re.MULTILINE)
-
-    # Restore code blocks
-    for i, block in enumerate(code_blocks):
-        text = text.replace(f"\x00CODE_BLOCK_{i}\x00", block)
-
-    # Restore inline code
-    for i, code in enumerate(inline_codes):
-        text = text.replace(f"\x00INLINE_CODE_{i}\x00", code)
-
-    return text
+    out = []
+    _convert(text, out)
+    return "".join(out)
 
 
 def format_response_blocks(text: str) -> list:
     """Format response as Slack blocks for richer display."""
     blocks = []
+    chunk_size = 2900  # Slack's section text limit is 3000 chars
 
     # Convert markdown first
     text = markdown_to_slack(text)
 
+    # Fast path: a short answer with no code blocks is a single section
+    if "```" not in text:
+        stripped = text.strip()
+        if stripped and len(stripped) <= chunk_size:
+            return [{
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": stripped
+                }
+            }]
+
     # Split on code blocks to handle them separately
-    parts = re.split(r'(```[\s\S]*?```)', text)
+    parts = _RE_CODE_SPLIT.split(text)
 
     for part in parts:
         if not part.strip():
@@ -77,10 +172,11 @@ def format_response_blocks(text: str) -> list:
             # Code block
             code = part.strip('`').strip()
             # Check if there's a language specifier
-            lines = code.split('\n')
-            if lines[0] and not ' ' in lines[0] and len(lines[0]) < 20:
+            newline = code.find('\n')
+            first_line = code[:newline] if newline >= 0 else code
+            if first_line and ' ' not in first_line and len(first_line) < 20:
                 # First line might be language
-                code = '\n'.join(lines[1:]) if len(lines) > 1 else ''
+                code = code[newline + 1:] if newline >= 0 else ''
 
             if code.strip():
                 blocks.append({
@@ -91,10 +187,16 @@ def format_response_blocks(text: str) -> list:
                     }
                 })
         else:
-            # Regular text - split into chunks if too long (Slack limit is 3000 chars)
-            chunk_size = 2900
-            for i in range(0, len(part), chunk_size):
-                chunk = part[i:i + chunk_size].strip()
+            # Regular text - split into chunks if too long,
+            # breaking at the last newline before the limit where possible
+            start = 0
+            while start < len(part):
+                end = min(start + chunk_size, len(part))
+                if end < len(part):
+                    newline = part.rfind('\n', start, end)
+                    if newline > start:
+                        end = newline
+                chunk = part[start:end].strip()
                 if chunk:
                     blocks.append({
                         "type": "section",
@@ -103,6 +205,7 @@ def format_response_blocks(text: str) -> list:
                             "text": chunk
                         }
                     })
+                start = end
 
     # Slack requires at least one block
     if not blocks:
@@ -120,35 +223,237 @@ def format_response_blocks(text: str) -> list:
 BASE_DIR = Path(__file__).parent
 CONFIG_PATH = BASE_DIR / "config.json"
 
-
+# Conversation limits
+MAX_SESSIONS = 128  # channels whose history is kept
+SESSION_TTL = 30 * 60  # seconds of inactivity before a channel's history is dropped
+EXPIRY_INTERVAL = 60  # seconds between idle-session sweeps
+STATUS_UPDATE_INTERVAL = 1.0  # seconds between status edits (chat.update allows ~1/sec)
+MAX_WORKERS = 4  # questions answered concurrently across channels
+
+# Commands
+_CLEAR_CMDS = frozenset({"clear", "reset", "start over"})
+_HELP_CMDS = frozenset({"help", "?"})
+
+_HELP_TEXT_MENTION = (
+    "*Strava Agent Help*\n\n"
+    "Just ask me questions about your Strava activities!\n\n"
+    "*Example questions:*\n"
+    "- What was my longest run this year?\n"
+    "- Compare my mileage this month vs last month\n"
+    "- What's my average heart rate on runs over 10 miles?\n"
+    "- Show me my fastest 5k\n"
+    "- How much elevation did I climb in 2024?\n\n"
+    "*Commands:*\n"
+    "- `clear` - Reset conversation history\n"
+    "- `help` - Show this message"
+)
+
+_HELP_TEXT_DM = (
+    "*Strava Agent Help*\n\n"
+    "Just ask me questions about your Strava activities!\n\n"
+    "*Example questions:*\n"
+    "- What was my longest run this year?\n"
+    "- Compare my mileage this month vs last month\n"
+    "- What's my average heart rate on runs over 10 miles?\n\n"
+    "*Commands:*\n"
+    "- `clear` - Reset conversation history\n"
+    "- `help` - Show this message"
+)
+
+_EMPTY_MENTION_TEXT = (
+    "Ask me anything about your Strava activities! For example:\n"
+    "- What was my longest run this year?\n"
+    "- How many miles did I bike in December?\n"
+    "- What's my average pace for 10k runs?"
+)
+
+
+@functools.lru_cache(maxsize=1)
 def load_config():
-    """Load configuration."""
-    with open(CONFIG_PATH, "r") as f:
-        return json.load(f)
+    """Load configuration, read from disk once per process."""
+    return orjson.loads(CONFIG_PATH.read_bytes())
 
 
 # Load config and initialize app
 config = load_config()
 app = App(token=config["slack"]["bot_token"])
 
-# Store agents per channel/user for conversation continuity
-agents = {}
+# Conversation state per channel for continuity, as [last_used, history, lock].
+# The lock keeps one question at a time per channel and lives and dies with the
+# history. Lookups of known channels are lock-free; agents_lock guards
+# insert/evict/expire.
+_histories: dict[str, list] = {}
 agents_lock = threading.Lock()
 
-
-def get_agent(channel_id: str) -> StravaAgent:
-    """Get or create an agent for a channel."""
-    with agents_lock:
-        if channel_id not in agents:
-            agents[channel_id] = StravaAgent()
-        return agents[channel_id]
+# Questions are answered off the Socket Mode dispatcher, one at a time per channel
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="strava-agent")
+
+
+def _get_session(channel_id: str) -> list:
+    """Get a channel's [last_used, history, lock] entry, creating it if needed."""
+    now = time.monotonic()
+    entry = _histories.get(channel_id)
+    if entry is None:
+        with agents_lock:
+            # Whichever handler gets here first creates the entry
+            entry = _histories.setdefault(channel_id, [now, [], threading.Lock()])
+            while len(_histories) > MAX_SESSIONS:
+                # Channels with a question in progress are not evicted
+                idle = [
+                    ch for ch, (_, _, lock) in _histories.items()
+                    if ch != channel_id and not lock.locked()
+                ]
+                if not idle:
+                    break
+                del _histories[min(idle, key=lambda ch: _histories[ch][0])]
+    entry[0] = now
+    return entry
 
 
 def clear_agent(channel_id: str):
     """Clear agent history for a channel."""
     with agents_lock:
-        if channel_id in agents:
-            agents[channel_id].clear_history()
+        _histories.pop(channel_id, None)
+
+
+def _expire_histories():
+    """Drop histories of channels idle for longer than SESSION_TTL, then reschedule."""
+    cutoff = time.monotonic() - SESSION_TTL
+    with agents_lock:
+        expired = [
+            ch for ch, (last_used, _, lock) in _histories.items()
+            if last_used <= cutoff and not lock.locked()
+        ]
+        for channel_id in expired:
+            del _histories[channel_id]
+
+    _schedule_expiry()
+
+
+def _schedule_expiry():
+    """Run the next idle-session sweep in the background."""
+    timer = threading.Timer(EXPIRY_INTERVAL, _expire_histories)
+    timer.daemon = True
+    timer.start()
+
+
+class ThrottledUpdater:
+    """Progress callback that edits a status message at most once per STATUS_UPDATE_INTERVAL.
+
+    Intermediate statuses are dropped but the latest one is always flushed,
+    unless close() is called first or it is already showing.
+    """
+
+    def __init__(self, client, channel: str, ts: str):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        # The "Thinking..." post at ts counts as the first message
+        self.last_sent = time.monotonic()
+        self.last_text = None
+        self.pending_text = None
+        self.timer = None
+        self.closed = False
+        # Held while sending so close() can't race an in-flight update
+        self.lock = threading.Lock()
+
+    def __call__(self, status: str):
+        with self.lock:
+            if self.closed:
+                return
+            self.pending_text = status
+            delay = STATUS_UPDATE_INTERVAL - (time.monotonic() - self.last_sent)
+            if delay > 0:
+                if self.timer is None:
+                    self.timer = threading.Timer(delay, self._flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+        self._flush()
+
+    def _flush(self):
+        """Send the latest pending status."""
+        with self.lock:
+            self.timer = None
+            if self.closed or self.pending_text is None:
+                return
+            status = self.pending_text
+            self.pending_text = None
+            if status == self.last_text:
+                return
+            self.last_text = status
+            self.last_sent = time.monotonic()
+            try:
+                self.client.chat_update(
+                    channel=self.channel,
+                    ts=self.ts,
+                    text=f"_{status}_",
+                )
+            except Exception:
+                pass  # Ignore update errors
+
+    def close(self):
+        """Stop sending updates, before the message is replaced with the answer."""
+        with self.lock:
+            self.closed = True
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+
+
+def _process_question(client, channel: str, ts: str, text: str):
+    """Worker entry point for EXECUTOR.
+
+    Nothing waits on the returned future, so anything that escapes is logged
+    here, as Bolt would have for an exception raised in a listener.
+    """
+    try:
+        _answer_question(client, channel, ts, text)
+    except Exception:
+        app.logger.exception(f"Failed to answer question in {channel}")
+
+
+def _answer_question(client, channel: str, ts: str, text: str):
+    """Answer a question and replace the "Thinking..." message at ts with the answer."""
+    update_status = ThrottledUpdater(client, channel, ts)
+
+    _, history, lock = _get_session(channel)
+    with lock:
+        # Agents share one Anthropic client, so they're cheap to create per message
+        agent = StravaAgent(history=history)
+
+        try:
+            # Get the answer
+            answer = agent.ask(text, on_update=update_status)
+            update_status.close()
+
+            # Format as blocks for better rendering
+            blocks = format_response_blocks(answer)
+
+            # Add cost info
+            cost_str = agent.get_cost_string()
+            if cost_str:
+                blocks.append({"type": "divider"})
+                blocks.append({
+                    "type": "context",
+                    "elements": [{"type": "mrkdwn", "text": f"_{cost_str}_"}]
+                })
+
+            # Update with final answer
+            client.chat_update(
+                channel=channel,
+                ts=ts,
+                text=answer,  # Fallback for notifications
+                blocks=blocks,
+            )
+
+        except Exception as e:
+            update_status.close()
+            client.chat_update(
+                channel=channel,
+                ts=ts,
+                text=f"Sorry, I encountered an error: {str(e)}",
+            )
 
 
 @app.event("app_mention")
@@ -159,88 +464,26 @@ def handle_mention(event, say, client):
     user = event["user"]
 
     # Extract the question (remove the bot mention)
-    text = re.sub(r"<@[A-Z0-9]+>", "", event["text"]).strip()
+    text = _RE_MENTION.sub("", event["text"]).strip()
 
     if not text:
-        say(
-            text="Ask me anything about your Strava activities! For example:\n"
-            "- What was my longest run this year?\n"
-            "- How many miles did I bike in December?\n"
-            "- What's my average pace for 10k runs?",
-            thread_ts=thread_ts,
-        )
+        say(text=_EMPTY_MENTION_TEXT, thread_ts=thread_ts)
         return
 
     # Handle special commands
-    if text.lower() in ["clear", "reset", "start over"]:
+    command = text.lower()
+    if command in _CLEAR_CMDS:
         clear_agent(channel)
         say(text="Conversation cleared. What would you like to know?", thread_ts=thread_ts)
         return
 
-    if text.lower() in ["help", "?"]:
-        say(
-            text="*Strava Agent Help*\n\n"
-            "Just ask me questions about your Strava activities!\n\n"
-            "*Example questions:*\n"
-            "- What was my longest run this year?\n"
-            "- Compare my mileage this month vs last month\n"
-            "- What's my average heart rate on runs over 10 miles?\n"
-            "- Show me my fastest 5k\n"
-            "- How much elevation did I climb in 2024?\n\n"
-            "*Commands:*\n"
-            "- `clear` - Reset conversation history\n"
-            "- `help` - Show this message",
-            thread_ts=thread_ts,
-        )
+    if command in _HELP_CMDS:
+        say(text=_HELP_TEXT_MENTION, thread_ts=thread_ts)
         return
 
-    # Send typing indicator / initial response
+    # Send typing indicator / initial response, then answer in the background
     initial = say(text="Thinking...", thread_ts=thread_ts)
-
-    def update_status(status: str):
-        """Update the message with current status."""
-        try:
-            client.chat_update(
-                channel=channel,
-                ts=initial["ts"],
-                text=f"_{status}_",
-            )
-        except Exception:
-            pass  # Ignore update errors
-
-    # Get or create agent for this channel
-    agent = get_agent(channel)
-
-    try:
-        # Get the answer
-        answer = agent.ask(text, on_update=update_status)
-
-        # Format as blocks for better rendering
-        blocks = format_response_blocks(answer)
-
-        # Add cost info
-        cost_str = agent.get_cost_string()
-        if cost_str:
-            blocks.append({"type": "divider"})
-            blocks.append({
-                "type": "context",
-                "elements": [{"type": "mrkdwn", "text": f"_{cost_str}_"}]
-            })
-
-        # Update with final answer
-        client.chat_update(
-            channel=channel,
-            ts=initial["ts"],
-            text=answer,  # Fallback for notifications
-            blocks=blocks,
-        )
-
-    except Exception as e:
-        client.chat_update(
-            channel=channel,
-            ts=initial["ts"],
-            text=f"Sorry, I encountered an error: {str(e)}",
-        )
+    EXECUTOR.submit(_process_question, client, channel, initial["ts"], text)
 
 
 @app.event("message")
@@ -261,65 +504,19 @@ def handle_dm(event, say, client):
         return
 
     # Handle special commands
-    if text.lower() in ["clear", "reset", "start over"]:
+    command = text.lower()
+    if command in _CLEAR_CMDS:
         clear_agent(channel)
         say(text="Conversation cleared. What would you like to know?")
         return
 
-    if text.lower() in ["help", "?"]:
-        say(
-            text="*Strava Agent Help*\n\n"
-            "Just ask me questions about your Strava activities!\n\n"
-            "*Example questions:*\n"
-            "- What was my longest run this year?\n"
-            "- Compare my mileage this month vs last month\n"
-            "- What's my average heart rate on runs over 10 miles?\n\n"
-            "*Commands:*\n"
-            "- `clear` - Reset conversation history\n"
-            "- `help` - Show this message"
-        )
+    if command in _HELP_CMDS:
+        say(text=_HELP_TEXT_DM)
         return
 
-    # Send typing indicator
+    # Send typing indicator, then answer in the background
     initial = say(text="Thinking...")
-
-    def update_status(status: str):
-        try:
-            client.chat_update(
-                channel=channel,
-                ts=initial["ts"],
-                text=f"_{status}_",
-            )
-        except Exception:
-            pass
-
-    agent = get_agent(channel)
-
-    try:
-        answer = agent.ask(text, on_update=update_status)
-        blocks = format_response_blocks(answer)
-
-        # Add cost info
-        cost_str = agent.get_cost_string()
-        if cost_str:
-            blocks.append({"type": "divider"})
-            blocks.append({
-                "type": "context",
-                "elements": [{"type": "mrkdwn", "text": f"_{cost_str}_"}]
-            })
-
-        client.chat_update(
-            channel=channel,
-            ts=initial["ts"],
-            text=answer,  # Fallback for notifications
-            blocks=blocks,
-        )
-    except Exception as e:
-        client.chat_update(
-            channel=channel,
-            ts=initial["ts"],
-            text=f"Sorry, I encountered an error: {str(e)}",
-        )
+    EXECUTOR.submit(_process_question, client, channel, initial["ts"], text)
 
 
 def main():
@@ -330,6 +527,8 @@ def main():
     print("  - Direct messages")
     print("\nPress Ctrl+C to stop.\n")
 
+    _schedule_expiry()
+
     handler = SocketModeHandler(app, config["slack"]["app_token"])
     handler.start()
 
@@ -6,30 +6,127 @@ Handles OAuth, incremental updates, and full syncs.
 
 from __future__ import annotations
 
-import json
+import atexit
+import functools
+import hashlib
 import os
 import sqlite3
+import threading
 import time
 import webbrowser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "db", "activities.db")
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
 TOKENS_PATH = os.path.join(os.path.dirname(__file__), "strava_tokens.json")
+NARROW_LAYOUT_VERSION = 1  # PRAGMA user_version once the narrow-layout migration has run
+
+PER_PAGE = 100
+PREFETCH_PAGES = 3  # page requests kept in flight while earlier pages are written
+RATE_LIMIT_WAIT = 60  # seconds to wait after a 429 without Retry-After
+RATE_LIMIT_RETRIES = 15  # enough 429 waits to outlast a 15-minute window
+MAX_PACE_DELAY = 60  # longest pause between pages when close to a rate limit
+
+
+@functools.lru_cache(maxsize=1)
+def load_config() -> dict:
+    """Load configuration, read from disk once per process."""
+    with open(CONFIG_PATH, "rb") as f:
+        return orjson.loads(f.read())
+
+
+@dataclass
+class Tokens:
+    """Strava OAuth tokens as stored in TOKENS_PATH."""
+
+    access_token: str = None
+    refresh_token: str = None
+    expires_at: int = 0
+
+
+# Last tokens read or written and the file mtime they correspond to
+_TOKENS_CACHE = {"mtime_ns": None, "tokens": None}
+
+
+def load_tokens() -> Tokens | None:
+    """Load saved tokens, re-reading the file only when its mtime changes."""
+    try:
+        mtime_ns = os.stat(TOKENS_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _TOKENS_CACHE["tokens"] is None or _TOKENS_CACHE["mtime_ns"] != mtime_ns:
+        with open(TOKENS_PATH, "rb") as f:
+            data = orjson.loads(f.read())
+        _TOKENS_CACHE["tokens"] = Tokens(
+            access_token=data.get("access_token"),
+            refresh_token=data.get("refresh_token"),
+            expires_at=data.get("expires_at", 0),
+        )
+        _TOKENS_CACHE["mtime_ns"] = mtime_ns
+    return _TOKENS_CACHE["tokens"]
+
+
+def save_tokens(tokens: Tokens) -> bool:
+    """Write tokens to TOKENS_PATH unless they match what's already there."""
+    if tokens == load_tokens():
+        return False
+    with open(TOKENS_PATH, "wb") as f:
+        f.write(orjson.dumps(asdict(tokens)))
+    _TOKENS_CACHE["tokens"] = tokens
+    _TOKENS_CACHE["mtime_ns"] = os.stat(TOKENS_PATH).st_mtime_ns
+    return True
+
+
+# One connection per thread, kept open for the life of the process
+_conn_local = threading.local()
+_open_conns = []
 
 
 def get_db_connection():
-    """Get a connection to the SQLite database."""
+    """Get this thread's connection to the SQLite database."""
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None:
+        return conn
+
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    # Autocommit mode; writers open explicit transactions with BEGIN IMMEDIATE
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    # WAL persists in the file; the rest are per-connection settings
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    # Autocheckpointing (default every 1000 pages) keeps the WAL from growing
+    # without bound, but never shrinks the -wal file; cap what it keeps on disk
+    conn.execute("PRAGMA journal_size_limit=16777216")
+    _conn_local.conn = conn
+    _open_conns.append(conn)
     return conn
 
 
+@atexit.register
+def _checkpoint_db():
+    """Fold the WAL back into the database file when the process exits."""
+    if _open_conns:
+        try:
+            _open_conns[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error:
+            pass  # Another process is still using the database
+
+
 def init_db():
     """Initialize the database schema."""
     conn = get_db_connection()
@@ -63,16 +160,26 @@ def init_db():
             comment_count INTEGER,
             athlete_count INTEGER,
             pr_count INTEGER,
-            start_latlng TEXT,
-            end_latlng TEXT,
+            start_lat REAL,
+            start_lng REAL,
+            end_lat REAL,
+            end_lng REAL,
             summary_polyline TEXT,
             gear_id TEXT,
             device_name TEXT,
-            raw_json TEXT,
+            summary_hash BLOB,
             synced_at TEXT
         );
 
-        CREATE INDEX IF NOT EXISTS idx_type ON activities(type);
+        -- Full API responses, kept out of the hot activities table
+        CREATE TABLE IF NOT EXISTS raw_activities (
+            id INTEGER PRIMARY KEY,
+            json TEXT
+        );
+
+        -- (type, start_date) also serves type-only filters, so idx_type is redundant
+        DROP INDEX IF EXISTS idx_type;
+        CREATE INDEX IF NOT EXISTS idx_type_date ON activities(type, start_date);
         CREATE INDEX IF NOT EXISTS idx_sport_type ON activities(sport_type);
         CREATE INDEX IF NOT EXISTS idx_start_date ON activities(start_date);
         CREATE INDEX IF NOT EXISTS idx_start_date_local ON activities(start_date_local);
@@ -88,31 +195,106 @@ def init_db():
             error TEXT
         );
     """)
+    _migrate_activities(conn)
     conn.commit()
-    conn.close()
     print("Database initialized.")
 
 
+def _migrate_activities(conn):
+    """Move databases created with JSON latlng/raw_json columns to the narrow layout."""
+    for col, col_type in (
+        ("start_lat", "REAL"),
+        ("start_lng", "REAL"),
+        ("end_lat", "REAL"),
+        ("end_lng", "REAL"),
+        ("summary_hash", "BLOB"),
+    ):
+        try:
+            conn.execute(f"ALTER TABLE activities ADD COLUMN {col} {col_type}")
+        except sqlite3.OperationalError:
+            pass  # Already there
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(activities)")}
+    # user_version marks a migration done on SQLite < 3.35, where the legacy
+    # columns stay behind (emptied) because they can't be dropped
+    migrated = conn.execute("PRAGMA user_version").fetchone()[0] >= NARROW_LAYOUT_VERSION
+    if "raw_json" not in columns or migrated:
+        return
+
+    print("Migrating activities to the narrow layout...")
+    can_drop = sqlite3.sqlite_version_info >= (3, 35, 0)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("""
+            UPDATE activities SET
+                start_lat = json_extract(start_latlng, '$[0]'),
+                start_lng = json_extract(start_latlng, '$[1]'),
+                end_lat = json_extract(end_latlng, '$[0]'),
+                end_lng = json_extract(end_latlng, '$[1]')
+            WHERE start_lat IS NULL AND end_lat IS NULL
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO raw_activities (id, json)
+            SELECT id, raw_json FROM activities WHERE raw_json IS NOT NULL
+        """)
+        if can_drop:
+            for col in ("start_latlng", "end_latlng", "raw_json"):
+                conn.execute(f"ALTER TABLE activities DROP COLUMN {col}")
+        else:
+            conn.execute("UPDATE activities SET start_latlng = NULL, end_latlng = NULL, raw_json = NULL")
+        conn.execute(f"PRAGMA user_version = {NARROW_LAYOUT_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # Reclaiming the space is optional; the migration is already committed
+    try:
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        print(f"Skipped VACUUM after migration: {e}")
+
+
+def _http_session(headers: dict = None) -> requests.Session:
+    """Keep-alive session that retries transient Strava errors with backoff.
+
+    429s are not retried here; they need a longer wait than the backoff gives
+    and are handled by StravaSync.fetch_activities.
+    """
+    session = requests.Session()
+    # Activity pages are ~30-40 KB of JSON; make sure they come back compressed
+    session.headers["Accept-Encoding"] = "gzip"
+    if headers:
+        session.headers.update(headers)
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+        raise_on_status=False,
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry))
+    return session
+
+
 class StravaAuth:
     """Handle Strava OAuth authentication."""
 
     def __init__(self):
-        with open(CONFIG_PATH, "r") as f:
-            config = json.load(f)
+        config = load_config()
         self.client_id = config["strava"]["client_id"]
         self.client_secret = config["strava"]["client_secret"]
         self.access_token = None
         self.refresh_token = None
         self.expires_at = None
+        self.session = _http_session()
 
     def authenticate(self):
         """Get valid access token, refreshing if needed."""
-        if os.path.exists(TOKENS_PATH):
-            with open(TOKENS_PATH, "r") as f:
-                tokens = json.load(f)
-                self.access_token = tokens.get("access_token")
-                self.refresh_token = tokens.get("refresh_token")
-                self.expires_at = tokens.get("expires_at", 0)
+        tokens = load_tokens()
+        if tokens is not None:
+            self.access_token = tokens.access_token
+            self.refresh_token = tokens.refresh_token
+            self.expires_at = tokens.expires_at
 
             # Check if token is expired or about to expire (5 min buffer)
             if self.expires_at and time.time() < self.expires_at - 300:
@@ -132,7 +314,7 @@ class StravaAuth:
 
     def _refresh_token(self):
         """Refresh the access token."""
-        response = requests.post(
+        response = self.session.post(
             "https://www.strava.com/oauth/token",
             data={
                 "client_id": self.client_id,
@@ -166,7 +348,7 @@ class StravaAuth:
         auth_code = self._wait_for_callback()
 
         # Exchange for tokens
-        response = requests.post(
+        response = self.session.post(
             "https://www.strava.com/oauth/token",
             data={
                 "client_id": self.client_id,
@@ -216,16 +398,54 @@ class StravaAuth:
         self.refresh_token = data["refresh_token"]
         self.expires_at = data["expires_at"]
 
-        with open(TOKENS_PATH, "w") as f:
-            json.dump(
-                {
-                    "access_token": self.access_token,
-                    "refresh_token": self.refresh_token,
-                    "expires_at": self.expires_at,
-                },
-                f,
-            )
-        print("Tokens saved.")
+        if save_tokens(Tokens(self.access_token, self.refresh_token, self.expires_at)):
+            print("Tokens saved.")
+
+
+def _row_tuple(activity: dict, summary_hash: bytes, synced_at: str) -> tuple:
+    """Build the StravaSync.COLUMNS parameters for an activity."""
+    # Strava sends [] for activities without GPS
+    start_lat, start_lng = activity.get("start_latlng") or (None, None)
+    end_lat, end_lng = activity.get("end_latlng") or (None, None)
+    return (
+        activity["id"],
+        activity.get("name"),
+        activity.get("type"),
+        activity.get("sport_type"),
+        activity.get("start_date"),
+        activity.get("start_date_local"),
+        activity.get("timezone"),
+        activity.get("distance"),
+        activity.get("moving_time"),
+        activity.get("elapsed_time"),
+        activity.get("total_elevation_gain"),
+        activity.get("elev_high"),
+        activity.get("elev_low"),
+        activity.get("average_speed"),
+        activity.get("max_speed"),
+        activity.get("average_heartrate"),
+        activity.get("max_heartrate"),
+        activity.get("average_cadence"),
+        activity.get("average_watts"),
+        activity.get("weighted_average_watts"),
+        activity.get("kilojoules"),
+        activity.get("suffer_score"),
+        activity.get("calories"),
+        activity.get("achievement_count"),
+        activity.get("kudos_count"),
+        activity.get("comment_count"),
+        activity.get("athlete_count"),
+        activity.get("pr_count"),
+        start_lat,
+        start_lng,
+        end_lat,
+        end_lng,
+        activity.get("map", {}).get("summary_polyline"),
+        activity.get("gear_id"),
+        activity.get("device_name"),
+        summary_hash,
+        synced_at,
+    )
 
 
 class StravaSync:
@@ -233,9 +453,45 @@ class StravaSync:
 
     BASE_URL = "https://www.strava.com/api/v3"
 
-    def __init__(self, access_token: str):
+    COLUMNS = (
+        "id", "name", "type", "sport_type", "start_date", "start_date_local", "timezone",
+        "distance", "moving_time", "elapsed_time", "total_elevation_gain",
+        "elev_high", "elev_low", "average_speed", "max_speed",
+        "average_heartrate", "max_heartrate", "average_cadence",
+        "average_watts", "weighted_average_watts", "kilojoules",
+        "suffer_score", "calories", "achievement_count", "kudos_count",
+        "comment_count", "athlete_count", "pr_count",
+        "start_lat", "start_lng", "end_lat", "end_lng", "summary_polyline",
+        "gear_id", "device_name", "summary_hash", "synced_at",
+    )
+
+    INSERT_SQL = (
+        f"INSERT INTO activities ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(COLUMNS))})"
+    )
+
+    # Incremental syncs keep what is already stored; forced syncs overwrite it,
+    # but only touch rows (and their index entries) whose data actually changed
+    INSERT_NEW_SQL = INSERT_SQL + " ON CONFLICT(id) DO NOTHING"
+    UPSERT_SQL = (
+        INSERT_SQL
+        + " ON CONFLICT(id) DO UPDATE SET "
+        + ", ".join(f"{col}=excluded.{col}" for col in COLUMNS[1:])
+        + " WHERE "
+        + " OR ".join(f"{col} IS NOT excluded.{col}" for col in COLUMNS[1:-1])
+    )
+
+    RAW_SQL = "INSERT OR REPLACE INTO raw_activities (id, json) VALUES (?, ?)"
+
+    def __init__(self, access_token: str, store_raw: bool = True):
         self.access_token = access_token
+        self.store_raw = store_raw
         self.headers = {"Authorization": f"Bearer {access_token}"}
+        # ((short_used, long_used), (short_limit, long_limit)) from the last response
+        self._rate = None
+        # Set when a sync fails so prefetches stop waiting out rate limits
+        self._stop = threading.Event()
+        self.session = _http_session(self.headers)
 
     def fetch_activities(self, per_page: int = 100, page: int = 1, after: int = None):
         """Fetch a page of activities."""
@@ -243,33 +499,81 @@ class StravaSync:
         if after:
             params["after"] = after
 
-        response = requests.get(
-            f"{self.BASE_URL}/athlete/activities",
-            headers=self.headers,
-            params=params,
-        )
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            # 5xx responses have already been retried with backoff by the session
+            response = self.session.get(f"{self.BASE_URL}/athlete/activities", params=params)
+            self._record_rate(response.headers)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            self._check_daily_limit()
+
+            # Rate limited - honour Retry-After when Strava sends it
+            try:
+                wait = int(response.headers.get("Retry-After", RATE_LIMIT_WAIT))
+            except ValueError:
+                wait = RATE_LIMIT_WAIT
+            print(f"Rate limited, waiting {wait}s...")
+            if self._stop.wait(wait):
+                raise Exception("Sync stopped while waiting on the rate limit")
 
         if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 429:
-            # Rate limited - wait and retry
-            print("Rate limited, waiting 60s...")
-            time.sleep(60)
-            return self.fetch_activities(per_page, page, after)
+            return orjson.loads(response.content)
         else:
             raise Exception(f"API error {response.status_code}: {response.text}")
 
+    def _record_rate(self, headers):
+        """Remember the usage/limit pairs from Strava's rate-limit headers."""
+        usage = headers.get("X-RateLimit-Usage")
+        limit = headers.get("X-RateLimit-Limit")
+        if not usage or not limit:
+            return
+        try:
+            used = tuple(int(v) for v in usage.split(","))
+            limits = tuple(int(v) for v in limit.split(","))
+        except ValueError:
+            return
+        if len(used) == 2 and len(limits) == 2:
+            self._rate = (used, limits)
+
+    def _check_daily_limit(self):
+        """Fail fast once the daily budget is spent; waiting would take until midnight UTC."""
+        if self._rate is None:
+            return
+        (_, long_used), (_, long_limit) = self._rate
+        if long_limit and long_used >= long_limit:
+            raise Exception(
+                f"Daily Strava rate limit reached ({long_used}/{long_limit} requests). "
+                "Try again after midnight UTC."
+            )
+
+    def _pace(self):
+        """Sleep between pages only when close to the 15-minute or daily cap."""
+        self._check_daily_limit()
+        if self._rate is None:
+            return
+        (short_used, long_used), (short_limit, long_limit) = self._rate
+
+        # Strava's windows reset on the quarter hour and at midnight UTC
+        now = time.time()
+        delay = 0.0
+        for used, limit, window in ((short_used, short_limit, 900), (long_used, long_limit, 86400)):
+            if not limit or used / limit < 0.8:
+                continue
+            remaining = window - now % window
+            calls_left = limit - used
+            delay = max(delay, remaining / calls_left if calls_left > 0 else remaining)
+
+        # Keep a sync (and the Slack worker running it) from stalling for hours;
+        # a 429 past the cap is waited out in fetch_activities
+        delay = min(delay, MAX_PACE_DELAY)
+        if delay:
+            print(f"  Approaching rate limit, pausing {delay:.1f}s...")
+            time.sleep(delay)
+
     def sync_all(self, force: bool = False):
         """Full sync of all activities."""
         conn = get_db_connection()
 
-        # Check for existing activities
-        existing = set()
-        if not force:
-            cursor = conn.execute("SELECT id FROM activities")
-            existing = {row[0] for row in cursor.fetchall()}
-            print(f"Found {len(existing)} existing activities in database.")
-
         # Log sync start
         sync_id = conn.execute(
             "INSERT INTO sync_log (sync_type, started_at, status) VALUES (?, ?, ?)",
@@ -277,38 +581,93 @@ class StravaSync:
         ).lastrowid
         conn.commit()
 
+        # Incremental syncs only ask Strava for activities newer than the
+        # latest one stored; ON CONFLICT covers any overlap at the boundary.
+        # Until a sync has completed, the table may hold only the newest pages
+        # of an interrupted first sync, so page through everything instead.
+        after = None
+        completed = conn.execute(
+            "SELECT 1 FROM sync_log WHERE status = 'success' LIMIT 1"
+        ).fetchone()
+        if not force and completed:
+            last_date, last_epoch = conn.execute(
+                "SELECT MAX(start_date), strftime('%s', MAX(start_date)) FROM activities"
+            ).fetchone()
+            if last_epoch is not None:
+                after = int(last_epoch)
+                print(f"Fetching activities after {last_date}")
+
         added = 0
         updated = 0
-        page = 1
+        page = 0
+
+        # Futures for the next pages, in page order
+        pool = ThreadPoolExecutor(max_workers=PREFETCH_PAGES)
+        in_flight = deque()
+        self._stop.clear()
+        succeeded = False
+
+        def fetch_next():
+            nonlocal page
+            page += 1
+            print(f"Fetching page {page}...")
+            in_flight.append(pool.submit(self.fetch_activities, per_page=PER_PAGE, page=page, after=after))
 
         try:
-            while True:
-                print(f"Fetching page {page}...")
-                activities = self.fetch_activities(per_page=100, page=page)
+            # Most incremental syncs are a single page, so only start
+            # prefetching once a full page says there's more
+            fetch_next()
+            while in_flight:
+                activities = in_flight.popleft().result()
 
                 if not activities:
                     break
 
-                for activity in activities:
-                    if activity["id"] in existing and not force:
-                        continue
-
-                    self._upsert_activity(conn, activity)
-                    if activity["id"] in existing:
-                        updated += 1
-                    else:
-                        added += 1
-                        existing.add(activity["id"])
-
+                more = len(activities) == PER_PAGE
+                while more and len(in_flight) < PREFETCH_PAGES:
+                    self._pace()
+                    fetch_next()
+
+                # Sorted-key JSON is both the raw_activities payload and the
+                # input to the summary hash used to spot unchanged activities
+                payloads = [orjson.dumps(a, option=orjson.OPT_SORT_KEYS) for a in activities]
+                synced_at = datetime.now().isoformat()
+                rows = [
+                    _row_tuple(activity, hashlib.blake2b(payload, digest_size=8).digest(), synced_at)
+                    for activity, payload in zip(activities, payloads)
+                ]
+                raw_rows = [(row[0], payload.decode()) for row, payload in zip(rows, payloads)]
+
+                # One transaction and one batched statement per page; SQLite
+                # decides insert vs update and total_changes gives the counts
+                conn.execute("BEGIN IMMEDIATE")
+                before = conn.total_changes
+                if force:
+                    page_ids = [row[0] for row in rows]
+                    stored = dict(conn.execute(
+                        f"SELECT id, summary_hash FROM activities WHERE id IN ({', '.join('?' * len(page_ids))})",
+                        page_ids,
+                    ))
+                    # stored only holds this page's ids, so the rest are new
+                    new = len(page_ids) - len(stored)
+                    # Activities whose hash matches what's stored aren't written at all
+                    changed = [i for i, row in enumerate(rows) if stored.get(row[0]) != row[-2]]
+                    rows = [rows[i] for i in changed]
+                    raw_rows = [raw_rows[i] for i in changed]
+                    conn.executemany(self.UPSERT_SQL, rows)
+                    added += new
+                    updated += conn.total_changes - before - new
+                else:
+                    conn.executemany(self.INSERT_NEW_SQL, rows)
+                    added += conn.total_changes - before
+                if self.store_raw:
+                    conn.executemany(self.RAW_SQL, raw_rows)
                 conn.commit()
                 print(f"  Processed {len(activities)} activities (added: {added}, updated: {updated})")
 
-                if len(activities) < 100:
+                if not more:
                     break
 
-                page += 1
-                time.sleep(0.5)  # Be nice to the API
-
             # Log success
             conn.execute(
                 """UPDATE sync_log
@@ -318,9 +677,18 @@ class StravaSync:
             )
             conn.commit()
 
+            # Refresh planner statistics, and copy the sync's WAL frames into the
+            # database without waiting on readers so the next writer can reuse
+            # the WAL from the start (journal_size_limit then truncates it)
+            conn.execute("PRAGMA optimize")
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
             print(f"\nSync complete: {added} added, {updated} updated")
+            succeeded = True
 
         except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
             conn.execute(
                 "UPDATE sync_log SET completed_at=?, status=?, error=? WHERE id=?",
                 (datetime.now().isoformat(), "error", str(e), sync_id),
@@ -329,65 +697,14 @@ class StravaSync:
             raise
 
         finally:
-            conn.close()
+            # Drop prefetches past the last page. After an error don't wait on
+            # running ones either: they may be sitting out a rate limit
+            if not succeeded:
+                self._stop.set()
+            pool.shutdown(wait=succeeded, cancel_futures=True)
 
         return added, updated
 
-    def _upsert_activity(self, conn, activity: dict):
-        """Insert or update an activity."""
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO activities (
-                id, name, type, sport_type, start_date, start_date_local, timezone,
-                distance, moving_time, elapsed_time, total_elevation_gain,
-                elev_high, elev_low, average_speed, max_speed,
-                average_heartrate, max_heartrate, average_cadence,
-                average_watts, weighted_average_watts, kilojoules,
-                suffer_score, calories, achievement_count, kudos_count,
-                comment_count, athlete_count, pr_count,
-                start_latlng, end_latlng, summary_polyline,
-                gear_id, device_name, raw_json, synced_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                activity["id"],
-                activity.get("name"),
-                activity.get("type"),
-                activity.get("sport_type"),
-                activity.get("start_date"),
-                activity.get("start_date_local"),
-                activity.get("timezone"),
-                activity.get("distance"),
-                activity.get("moving_time"),
-                activity.get("elapsed_time"),
-                activity.get("total_elevation_gain"),
-                activity.get("elev_high"),
-                activity.get("elev_low"),
-                activity.get("average_speed"),
-                activity.get("max_speed"),
-                activity.get("average_heartrate"),
-                activity.get("max_heartrate"),
-                activity.get("average_cadence"),
-                activity.get("average_watts"),
-                activity.get("weighted_average_watts"),
-                activity.get("kilojoules"),
-                activity.get("suffer_score"),
-                activity.get("calories"),
-                activity.get("achievement_count"),
-                activity.get("kudos_count"),
-                activity.get("comment_count"),
-                activity.get("athlete_count"),
-                activity.get("pr_count"),
-                json.dumps(activity.get("start_latlng")),
-                json.dumps(activity.get("end_latlng")),
-                activity.get("map", {}).get("summary_polyline"),
-                activity.get("gear_id"),
-                activity.get("device_name"),
-                json.dumps(activity),
-                datetime.now().isoformat(),
-            ),
-        )
-
 
 def main():
     """Run sync from command line."""
@@ -396,6 +713,7 @@ def main():
     parser = argparse.ArgumentParser(description="Sync Strava activities to SQLite")
     parser.add_argument("--force", action="store_true", help="Force full resync")
     parser.add_argument("--init", action="store_true", help="Initialize database only")
+    parser.add_argument("--no-raw", action="store_true", help="Don't keep full API responses in raw_activities")
     args = parser.parse_args()
 
     init_db()
@@ -407,7 +725,7 @@ def main():
     auth = StravaAuth()
     access_token = auth.authenticate()
 
-    sync = StravaSync(access_token)
+    sync = StravaSync(access_token, store_raw=not args.no_raw)
     sync.sync_all(force=args.force)
 
 